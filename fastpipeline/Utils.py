@@ -38,6 +38,8 @@ def get_result_file(folderpath):
     '''A helper function to find the file that contains the result of computations done on a node'''
     
     possible_result_files = glob.glob(path.join(folderpath, 'result_*.pkl'))
+    # Sharded results are directories, they only count once their manifest has been written
+    possible_result_files += [d for d in glob.glob(path.join(folderpath, 'result_*')) if path.isfile(path.join(d, 'manifest.json'))]
     if len(possible_result_files) != 1:
         return None
     else:
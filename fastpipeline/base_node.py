@@ -1,5 +1,6 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from fastpipeline.Utils import get_code_text_from_object, get_hash_of_text
+from fastpipeline.sharding import check_shard_settings
 import inspect
 
 class BaseNode:
@@ -20,6 +21,12 @@ class BaseNode:
         whether to save the node itself
     save_code: bool, default True
         whether to save the code text corresponding the class of this object
+    shard_size: int, optional
+        if set, the result is saved as shards of at most this many rows (or items) that are written and read in parallel
+    compress_shards: bool, default False
+        whether to compress each shard of the result, only used when shard_size is set
+    num_workers: int, optional
+        number of threads used to write and read shards, only used when shard_size is set
 
     Methods
     -------
@@ -33,7 +40,7 @@ class BaseNode:
         Gets the name of class for whom this object is instantiated
     
     """
-    def __init__(self, config: Dict[str, Any] = {}, save_config: bool = True, save_result: bool = True, save_object: bool = True, save_code: bool = True):
+    def __init__(self, config: Dict[str, Any] = {}, save_config: bool = True, save_result: bool = True, save_object: bool = True, save_code: bool = True, shard_size: Optional[int] = None, compress_shards: bool = False, num_workers: Optional[int] = None):
         """
         Constructs all the necessary attributes for the BaseNode object.
 
@@ -49,12 +56,23 @@ class BaseNode:
                 whether to save the node itself
             save_code: bool, default True
                 whether to save the code text corresponding the class of this object
+            shard_size: int, optional
+                if set, the result is saved as shards of at most this many rows (or items) that are written and read in parallel
+            compress_shards: bool, default False
+                whether to compress each shard of the result, only used when shard_size is set
+            num_workers: int, optional
+                number of threads used to write and read shards, only used when shard_size is set
         """
+        # Fail here rather than after run() has done all the work
+        check_shard_settings(shard_size, num_workers)
         self.config = config
         self.save_config = save_config
         self.save_result = save_result
         self.save_object = save_object
         self.save_code = save_code
+        self.shard_size = shard_size
+        self.compress_shards = compress_shards
+        self.num_workers = num_workers
 
     def run(self, input: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -8,6 +8,7 @@ from datetime import datetime
 
 from fastpipeline.base_node import BaseNode
 from fastpipeline.Utils import get_hash_of_text, get_code_text_from_object, colored_logging, get_result_file
+from fastpipeline.sharding import save_sharded_result, load_sharded_result, check_sharded_result
 
 class Pipeline:
     """
@@ -82,7 +83,8 @@ class Pipeline:
         4) The pickled result corresponding to each of the inputs
 
         You'll find (1), (2) and (3) inside [experiments_dir]/[experiment_name]/[node_name]_[node_hash]
-        And (4) inside [experiments_dir]/[experiment_name]/[node_name]_[node_hash]/input_[input_hash]/[output_hash].pkl
+        And (4) inside [experiments_dir]/[experiment_name]/[node_name]_[node_hash]/input_[input_hash]/result_[output_hash].pkl
+        If the node has a shard_size, (4) is instead a directory result_[output_hash] containing the shards and a manifest.json
 
         Parameters
         ----------
@@ -185,8 +187,11 @@ class Pipeline:
             if existing_result_filepath is not None:
                 colored_logging('Found existing results... Loading...', color1='green')
                 # load existing result from previous run
-                with open(existing_result_filepath, 'rb') as f:
-                    out = pkl.load(f)
+                if path.isdir(existing_result_filepath):
+                    out = load_sharded_result(existing_result_filepath, num_workers=node.num_workers)
+                else:
+                    with open(existing_result_filepath, 'rb') as f:
+                        out = pkl.load(f)
                 
                 node_log['result_filepath'] = existing_result_filepath
                 node_log['reused_result'] = True
@@ -197,13 +202,22 @@ class Pipeline:
                 out = node.run(input)
                 if node.save_result:
                     result_hash = get_hash_of_text(str(out))
-                    result_filepath = path.join(result_dir, 'result_%s.pkl'%result_hash)
                     os.makedirs(result_dir, exist_ok=True)
-                    try:
-                        with open(result_filepath, 'wb') as f:
-                            pkl.dump(out, f)
-                    except:
-                        raise AttributeError('Result is not picklable')
+                    if node.shard_size is not None:
+                        result_filepath = path.join(result_dir, 'result_%s'%result_hash)
+                        # A malformed result or a failing disk should be reported as such, only pickling errors are rephrased
+                        check_sharded_result(out)
+                        try:
+                            save_sharded_result(out, result_filepath, node.shard_size, compress=node.compress_shards, num_workers=node.num_workers)
+                        except (pkl.PicklingError, TypeError, AttributeError):
+                            raise AttributeError('Result is not picklable')
+                    else:
+                        result_filepath = path.join(result_dir, 'result_%s.pkl'%result_hash)
+                        try:
+                            with open(result_filepath, 'wb') as f:
+                                pkl.dump(out, f)
+                        except:
+                            raise AttributeError('Result is not picklable')
                     node_log['result_filepath'] = result_filepath
                 else:
                     node_log['result_filepath'] = None
@@ -0,0 +1,288 @@
+import os
+import json
+import zlib
+import hashlib
+import pickle as pkl
+from os import path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Callable
+
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def _kind_of_value(value: Any) -> str:
+    '''Figure out how a value can be split into shards, anything we don't know how to split is stored as a single shard'''
+
+    # Only exact types are split, subclasses (namedtuples, masked arrays...) would be rebuilt as their base type
+    value_type = type(value)
+    if value_type is list:
+        return 'list'
+    if value_type is tuple:
+        return 'tuple'
+
+    # numpy and pandas are optional, we only check for them if the value comes from those packages
+    module = value_type.__module__ or ''
+    if module.startswith('numpy'):
+        import numpy as np
+        if value_type is np.ndarray and value.ndim > 0:
+            return 'ndarray'
+    if module.startswith('pandas'):
+        import pandas as pd
+        if value_type is pd.DataFrame:
+            return 'dataframe'
+        if value_type is pd.Series:
+            return 'series'
+
+    return 'object'
+
+
+def _is_positive_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def check_shard_settings(shard_size: Optional[int], num_workers: Optional[int] = None):
+    '''Make sure the sharding settings of a node are usable, so that a bad value fails before the node runs rather than after'''
+
+    if shard_size is not None and not _is_positive_int(shard_size):
+        raise ValueError('shard_size must be a positive integer, got %s' % repr(shard_size))
+    if num_workers is not None and not _is_positive_int(num_workers):
+        raise ValueError('num_workers must be a positive integer, got %s' % repr(num_workers))
+
+
+def check_sharded_result(result: Any):
+    '''Make sure a result can be described by a manifest: it has to be a dictionary with string keys'''
+
+    if not isinstance(result, dict):
+        raise TypeError('Only dictionaries can be saved as sharded results')
+    for key in result.keys():
+        if not isinstance(key, str):
+            raise TypeError('Keys of a sharded result must be strings, got %s' % repr(key))
+
+
+def _resolve_num_workers(num_workers: Optional[int]) -> int:
+    '''Same default as ThreadPoolExecutor, we need the actual number to bound the jobs in flight'''
+
+    return num_workers or min(32, (os.cpu_count() or 1) + 4)
+
+
+def _bounded_map(executor: ThreadPoolExecutor, fn: Callable, jobs: Iterable[tuple], window: int) -> Iterator[Any]:
+    '''Run fn over jobs on the executor with at most `window` jobs in flight, yielding the results in order'''
+
+    pending = deque()
+    for job in jobs:
+        pending.append(executor.submit(fn, *job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _slice_value(value: Any, kind: str, start: int, stop: int) -> Any:
+    '''Get rows [start, stop) of a splittable value'''
+
+    if kind == 'object':
+        return value
+    if kind in ('dataframe', 'series'):
+        return value.iloc[start:stop]
+    return value[start:stop]
+
+
+def _write_shard(filepath: str, value: Any, kind: str, start: int, stop: int, compress: bool) -> Dict[str, Any]:
+    '''Slice out a single shard, serialize it to disk and return its manifest entry'''
+
+    # The slice is taken here so that only the shards currently being written exist in memory
+    data = pkl.dumps(_slice_value(value, kind, start, stop), protocol=pkl.HIGHEST_PROTOCOL)
+    if compress:
+        data = zlib.compress(data)
+    with open(filepath, 'wb') as f:
+        f.write(data)
+    return {
+        'file': path.basename(filepath),
+        'md5': hashlib.md5(data).hexdigest(),
+        'nbytes': len(data),
+        'compressed': compress,
+        'start': start,
+        'stop': stop
+    }
+
+
+def _read_shard(filepath: str, entry: Dict[str, Any]) -> Any:
+    '''Read a single shard from disk after verifying its checksum'''
+
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    if hashlib.md5(data).hexdigest() != entry['md5']:
+        raise IOError('Checksum mismatch for shard %s' % filepath)
+    if entry['compressed']:
+        # Rebinding drops the compressed bytes as soon as they are decompressed
+        data = zlib.decompress(data)
+    value = pkl.loads(data)
+    del data
+    return value
+
+
+def _read_shard_into(filepath: str, entry: Dict[str, Any], out: Any, offset: int):
+    '''Read an array shard and copy it straight into its rows of the preallocated output'''
+
+    part = _read_shard(filepath, entry)
+    out[offset:offset + len(part)] = part
+
+
+def save_sharded_result(result: Dict[str, Any], result_path: str, shard_size: int, compress: bool = False, num_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Save the output of a node as a directory of shards written in parallel.
+
+    Lists, tuples, numpy arrays and pandas frames/series (exact types, not subclasses) are split into row ranges of at most `shard_size` rows, every other value is stored as a single shard. At most 2 * num_workers shards are queued at once so memory use does not grow with the size of the result. A manifest.json inside `result_path` records the layout and the md5 checksum of each shard.
+
+    Parameters
+    ----------
+    result : Dict[str, Any]
+        Output of a node
+    result_path : str
+        Directory in which the shards and the manifest are written
+    shard_size : int
+        Maximum number of rows (or items) per shard
+    compress : bool, default False
+        whether to compress each shard with zlib
+    num_workers : int, optional
+        Number of threads used for writing, defaults to the ThreadPoolExecutor default
+
+    Returns
+    -------
+    manifest : Dict[str, Any]
+        The manifest that was written to disk
+    """
+    # Validate everything before any file is written so that a failure never leaves stray shards behind
+    if shard_size is None:
+        raise ValueError('shard_size must be a positive integer, got None')
+    check_shard_settings(shard_size, num_workers)
+    check_sharded_result(result)
+    num_workers = _resolve_num_workers(num_workers)
+
+    os.makedirs(result_path, exist_ok=True)
+    manifest = {'version': MANIFEST_VERSION, 'keys': {}}
+    jobs = []
+
+    for key_id, (key, value) in enumerate(result.items()):
+        kind = _kind_of_value(value)
+        if kind == 'object':
+            ranges = [(None, None)]
+        else:
+            n_rows = len(value)
+            ranges = [(start, min(start + shard_size, n_rows)) for start in range(0, n_rows, shard_size)] or [(0, 0)]
+
+        manifest['keys'][key] = {'key_id': key_id, 'kind': kind, 'shards': []}
+        for shard_id, (start, stop) in enumerate(ranges):
+            filepath = path.join(result_path, 'shard_%s_%s.pkl' % (key_id, shard_id))
+            jobs.append((key, (filepath, value, kind, start, stop, compress)))
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        entries = _bounded_map(executor, _write_shard, (job for _, job in jobs), 2 * num_workers)
+        for (key, _), entry in zip(jobs, entries):
+            manifest['keys'][key]['shards'].append(entry)
+
+    # The manifest is written last and moved into place in one step, a directory without one is an incomplete save
+    manifest_filepath = path.join(result_path, MANIFEST_FILENAME)
+    with open(manifest_filepath + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(manifest_filepath + '.tmp', manifest_filepath)
+
+    return manifest
+
+
+def read_manifest(result_path: str) -> Dict[str, Any]:
+    '''Read the manifest describing the shard layout of a sharded result'''
+
+    with open(path.join(result_path, MANIFEST_FILENAME), 'r') as f:
+        return json.load(f)
+
+
+def _load_value(executor: ThreadPoolExecutor, result_path: str, kind: str, entries: List[Dict[str, Any]], window: int) -> Any:
+    '''Load the selected shards of a single value, keeping peak memory close to the size of the value itself'''
+
+    jobs = ((path.join(result_path, entry['file']), entry) for entry in entries)
+
+    if kind == 'object':
+        return _read_shard(*next(jobs))
+
+    if kind == 'ndarray':
+        import numpy as np
+        # The first shard tells us dtype and trailing dimensions, the rest is copied into place by the workers
+        first = _read_shard(*next(jobs))
+        n_rows = sum(entry['stop'] - entry['start'] for entry in entries)
+        out = np.empty((n_rows,) + first.shape[1:], dtype=first.dtype)
+        out[:len(first)] = first
+        offset = len(first)
+        del first
+
+        offset_jobs = []
+        for filepath, entry in jobs:
+            offset_jobs.append((filepath, entry, out, offset))
+            offset += entry['stop'] - entry['start']
+        for _ in _bounded_map(executor, _read_shard_into, offset_jobs, window):
+            pass
+        return out
+
+    if kind in ('list', 'tuple'):
+        out = []
+        for part in _bounded_map(executor, _read_shard, jobs, window):
+            out.extend(part)
+            del part
+        return out if kind == 'list' else tuple(out)
+
+    if kind in ('dataframe', 'series'):
+        import pandas as pd
+        return pd.concat(list(_bounded_map(executor, _read_shard, jobs, window)))
+
+    raise ValueError('Unknown shard kind: %s' % kind)
+
+
+def load_sharded_result(result_path: str, keys: Optional[List[str]] = None, shards: Optional[List[int]] = None, num_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Load a result saved with save_sharded_result, reading the shards in parallel.
+
+    Arrays are preallocated and filled in place and lists are extended shard by shard, so loading needs about as much memory as the result itself.
+
+    Parameters
+    ----------
+    result_path : str
+        Directory containing the shards and the manifest
+    keys : List[str], optional
+        Only load these keys of the result, all keys are loaded by default
+    shards : List[int], optional
+        Only load shards with these indices for each splittable value, all shards are loaded by default. The indices are sorted and deduplicated so rows always come back in their original order, indices past the last shard of a value are ignored and negative indices raise a ValueError. Values that were stored as a single object are always loaded
+    num_workers : int, optional
+        Number of threads used for reading, defaults to the ThreadPoolExecutor default
+
+    Returns
+    -------
+    out : Dict[str, Any]
+        The (partial) output of the node
+    """
+    check_shard_settings(None, num_workers)
+    num_workers = _resolve_num_workers(num_workers)
+    manifest = read_manifest(result_path)
+    if keys is None:
+        keys = list(manifest['keys'].keys())
+    for key in keys:
+        if key not in manifest['keys']:
+            raise KeyError('Key %s not found in manifest of %s' % (key, result_path))
+    if shards is not None:
+        if any(i < 0 for i in shards):
+            raise ValueError('Shard indices must be non-negative, got %s' % repr(shards))
+        shards = sorted(set(shards))
+
+    out = {}
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for key in keys:
+            key_info = manifest['keys'][key]
+            entries = key_info['shards']
+            if shards is not None and key_info['kind'] != 'object':
+                entries = [entries[i] for i in shards if i < len(entries)]
+            # Keys for which none of the requested shards exist are left out
+            if entries:
+                out[key] = _load_value(executor, result_path, key_info['kind'], entries, 2 * num_workers)
+
+    return out
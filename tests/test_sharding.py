@@ -0,0 +1,124 @@
+import os
+import pytest
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+from fastpipeline.base_node import BaseNode
+from fastpipeline.pipeline import Pipeline
+from fastpipeline.Utils import get_hash_of_text
+from fastpipeline.sharding import save_sharded_result, load_sharded_result, read_manifest
+
+SHARDED_OUT = {
+    'list': [x for x in range(25)],
+    'array': np.arange(50).reshape(25, 2),
+    'df': pd.DataFrame({
+                'col1': [x for x in range(25)],
+                'col2': [str(x) for x in range(25)]
+            }),
+    'value': 'not splittable'
+}
+
+class ShardedNode(BaseNode):
+    '''Returns a dict with values that get split into shards'''
+    def __init__(self):
+        super().__init__(shard_size=10, compress_shards=True, num_workers=4)
+
+    def run(self, input):
+        return SHARDED_OUT
+
+
+class NotADictNode(BaseNode):
+    '''Returns a list, which can't be described by a manifest'''
+    def __init__(self):
+        super().__init__(shard_size=10)
+
+    def run(self, input):
+        return [1, 2, 3]
+
+
+def check_equal_to_sharded_out(out):
+    assert out['list'] == SHARDED_OUT['list']
+    assert (out['array'] == SHARDED_OUT['array']).all()
+    assert (out['df'] == SHARDED_OUT['df']).all().all()
+    assert out['value'] == SHARDED_OUT['value']
+
+def test_sharded_pipeline():
+    pipeline = Pipeline('sharding_test', [ShardedNode()])
+    check_equal_to_sharded_out(pipeline.run(input={}))
+
+    # The second run reloads the shards
+    pipeline = Pipeline('sharding_test', [ShardedNode()])
+    out = pipeline.run(input={})
+    assert pipeline.log['nodes'][1]['reused_result']
+    check_equal_to_sharded_out(out)
+
+def test_load_subset_of_shards(tmp_path):
+    result_path = os.path.join(str(tmp_path), 'result')
+    manifest = save_sharded_result(SHARDED_OUT, result_path, shard_size=10)
+    assert manifest == read_manifest(result_path)
+    assert len(manifest['keys']['list']['shards']) == 3
+    assert len(manifest['keys']['value']['shards']) == 1
+
+    out = load_sharded_result(result_path, keys=['list', 'df', 'value'], shards=[1, 2])
+    assert out['list'] == SHARDED_OUT['list'][10:]
+    assert (out['df'] == SHARDED_OUT['df'].iloc[10:]).all().all()
+    assert out['value'] == SHARDED_OUT['value']
+    assert 'array' not in out
+
+    # Indices are sorted and deduplicated, indices past the last shard are ignored
+    out = load_sharded_result(result_path, keys=['list'], shards=[2, 0, 2, 7])
+    assert out['list'] == SHARDED_OUT['list'][:10] + SHARDED_OUT['list'][20:]
+
+    with pytest.raises(ValueError):
+        load_sharded_result(result_path, shards=[-1])
+
+def test_namedtuple_is_not_split(tmp_path):
+    Point = namedtuple('Point', ['x', 'y', 'z'])
+    result_path = os.path.join(str(tmp_path), 'result')
+    manifest = save_sharded_result({'p': Point(1, 2, 3)}, result_path, shard_size=1)
+    assert manifest['keys']['p']['kind'] == 'object'
+
+    out = load_sharded_result(result_path)
+    assert isinstance(out['p'], Point)
+    assert out['p'].x == 1
+
+def test_corrupted_shard(tmp_path):
+    result_path = os.path.join(str(tmp_path), 'result')
+    manifest = save_sharded_result(SHARDED_OUT, result_path, shard_size=10)
+    shard_file = manifest['keys']['list']['shards'][1]['file']
+    with open(os.path.join(result_path, shard_file), 'ab') as f:
+        f.write(b'corrupted')
+
+    with pytest.raises(IOError):
+        load_sharded_result(result_path, keys=['list'])
+
+def test_bad_shard_size():
+    for shard_size in [0, -1, 10.0, True]:
+        with pytest.raises(ValueError):
+            BaseNode(shard_size=shard_size)
+    with pytest.raises(ValueError):
+        BaseNode(shard_size=10, num_workers=0)
+
+def test_sharded_result_not_a_dict():
+    pipeline = Pipeline('sharding_test', [NotADictNode()])
+    with pytest.raises(Exception, match='Only dictionaries'):
+        pipeline.run(input={})
+
+def test_leftover_shards_without_manifest(tmp_path):
+    node = ShardedNode()
+    experiments_dir = str(tmp_path)
+    result_dir = os.path.join(experiments_dir, 'sharding_test', '%s_%s' % (node.name(), node.hash()), 'input_%s' % get_hash_of_text(str({})))
+    leftover_dir = os.path.join(result_dir, 'result_leftover')
+    os.makedirs(leftover_dir)
+    with open(os.path.join(leftover_dir, 'shard_0_0.pkl'), 'wb') as f:
+        f.write(b'partial')
+
+    # The incomplete save is ignored and the node runs again
+    pipeline = Pipeline('sharding_test', [node], experiments_dir=experiments_dir)
+    check_equal_to_sharded_out(pipeline.run(input={}))
+    assert not pipeline.log['nodes'][1]['reused_result']
+
+    pipeline = Pipeline('sharding_test', [ShardedNode()], experiments_dir=experiments_dir)
+    check_equal_to_sharded_out(pipeline.run(input={}))
+    assert pipeline.log['nodes'][1]['reused_result']